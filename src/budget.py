@@ -4,7 +4,7 @@ from typing import Dict, Optional
 from .exceptions import BudgetError
 
 
-@dataclass
+@dataclass(slots=True)
 class Budget:
     month: int
     year: int
@@ -1,6 +1,17 @@
 import argparse
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
 
 
+def _amount(value: str) -> Decimal:
+    # Parsed as Decimal so typed amounts never pass through a binary float
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise argparse.ArgumentTypeError(f"invalid amount: '{value}'")
+
+
+@lru_cache(maxsize=1)
 def create_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description='Expense Tracker CLI')
     subparsers = parser.add_subparsers(dest='command',
@@ -10,7 +21,7 @@ def create_parser() -> argparse.ArgumentParser:
     add_parser = subparsers.add_parser('add', help='Add a new expense')
     add_parser.add_argument('--description', required=True,
                             help='Expense description')
-    add_parser.add_argument('--amount', required=True, type=float,
+    add_parser.add_argument('--amount', required=True, type=_amount,
                             help='Expense amount')
     add_parser.add_argument('--category', required=True,
                             help='Expense category')
@@ -21,7 +32,7 @@ def create_parser() -> argparse.ArgumentParser:
     budget_parser.add_argument('--month', required=True, type=int,
                                help='Month (1-12)')
     budget_parser.add_argument('--year', required=True, type=int, help='Year')
-    budget_parser.add_argument('--amount', required=True, type=float,
+    budget_parser.add_argument('--amount', required=True, type=_amount,
                                help='Budget amount')
     budget_parser.add_argument('--category-limits', type=str,
                                help='Category limits in format'
@@ -5,7 +5,7 @@ from decimal import Decimal
 from .exceptions import ValidationError
 
 
-@dataclass
+@dataclass(slots=True)
 class Expense:
     description: str
     amount: Decimal
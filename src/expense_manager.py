@@ -1,24 +1,40 @@
 from datetime import datetime
 from typing import Optional, Dict, Tuple
-from decimal import Decimal
-import csv
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN
 from pathlib import Path
 from .expense import Expense
 from .budget import Budget
 from .storage_handler import StorageHandler
-from .exceptions import StorageError
+from .exceptions import StorageError, ValidationError
+from .money import CENT, MONEY_CONTEXT
+
+
+def _to_decimal(amount: Decimal) -> Decimal:
+    value = Decimal(amount)
+    if not value.is_finite():
+        raise ValidationError("Amount must be a finite number")
+    try:
+        rounded = value.quantize(CENT, rounding=ROUND_HALF_EVEN,
+                                 context=MONEY_CONTEXT)
+    except InvalidOperation:
+        raise ValidationError(f"Amount {amount} is too large")
+    if value > 0 and rounded == 0:
+        raise ValidationError("Amount must be at least 0.01 "
+                              "(amounts are rounded to whole cents)")
+    return rounded
 
 
 class ExpenseManager:
     def __init__(self, storage: StorageHandler):
         self.storage = storage
 
-    def add_expense(self, description: str,
-                    amount: float, category: str) -> Tuple[int, Optional[str]]:
+    def add_expense(self, description: str, amount: Decimal, category: str,
+                    when: Optional[datetime] = None
+                    ) -> Tuple[int, Optional[str]]:
         expense = Expense(
             description=description,
-            amount=Decimal(str(amount)),
-            date=datetime.now(),
+            amount=_to_decimal(amount),
+            date=when if when is not None else datetime.now(),
             category=category
         )
 
@@ -34,14 +50,12 @@ class ExpenseManager:
         if year is None:
             year = datetime.now().year
 
-        expenses = self.storage.get_all_expenses()
-        monthly_expenses = [
-            exp for exp in expenses
-            if exp.date.month == month and exp.date.year == year
-        ]
-        return sum((exp.amount for exp in monthly_expenses), Decimal('0'))
+        return self.storage.monthly_total(month, year)
 
     def _check_budget_warning(self, expense: Expense) -> Optional[str]:
+        if not self.storage.has_budgets():
+            return None
+
         current_month = expense.date.month
         current_year = expense.date.year
 
@@ -49,13 +63,10 @@ class ExpenseManager:
         if not budget:
             return None
 
-        monthly_total = self.get_monthly_summary(current_month, current_year)
-        category_total = self.get_category_summary(expense.category,
-                                                   current_month, current_year)
-
         warnings = []
 
         # Check total budget
+        monthly_total = self.get_monthly_summary(current_month, current_year)
         if monthly_total > budget.amount:
             warnings.append(f"Total budget of "
                             f"${float(budget.amount):.2f} exceeded!")
@@ -64,6 +75,8 @@ class ExpenseManager:
         if (budget.category_limits and
                 expense.category in budget.category_limits):
             category_limit = budget.category_limits[expense.category]
+            category_total = self.get_category_summary(
+                expense.category, current_month, current_year)
             if category_total > category_limit:
                 warnings.append(
                     f"Category '{expense.category}' budget of "
@@ -72,14 +85,15 @@ class ExpenseManager:
 
         return " ".join(warnings) if warnings else None
 
-    def set_budget(self, month: int, year: int, amount: float,
-                   category_limits: Optional[Dict[str, float]] = None) -> None:
+    def set_budget(self, month: int, year: int, amount: Decimal,
+                   category_limits: Optional[Dict[str, Decimal]] = None
+                   ) -> None:
         budget = Budget(
             month=month,
             year=year,
-            amount=Decimal(str(amount)),
+            amount=_to_decimal(amount),
             category_limits={
-                k: Decimal(str(v)) for k, v in (category_limits or {}).items()
+                k: _to_decimal(v) for k, v in (category_limits or {}).items()
                 }
         )
         budget.validate()
@@ -87,31 +101,19 @@ class ExpenseManager:
 
     def get_category_summary(self, category: str, month: Optional[int] = None,
                              year: Optional[int] = None) -> Decimal:
-        expenses = self.storage.get_all_expenses()
-        filtered_expenses = [
-            exp for exp in expenses
-            if exp.category == category
-            and (month is None or exp.date.month == month)
-            and (year is None or exp.date.year == year)
-        ]
-        return sum((exp.amount for exp in filtered_expenses), Decimal('0'))
+        return self.storage.category_total(category, month, year)
 
     def export_to_csv(self, filepath: str) -> None:
-        expenses = self.storage.get_all_expenses()
+        import csv
+
         filepath = Path(filepath)
 
         try:
-            with open(filepath, 'w', newline='') as csvfile:
+            with open(filepath, 'w', newline='',
+                      buffering=1 << 20) as csvfile:
                 writer = csv.writer(csvfile)
                 writer.writerow(
                     ['ID', 'Date', 'Description', 'Amount', 'Category'])
-                for expense in expenses:
-                    writer.writerow([
-                        expense.id,
-                        expense.date.strftime('%Y-%m-%d'),
-                        expense.description,
-                        float(expense.amount),
-                        expense.category
-                    ])
+                writer.writerows(self.storage.iter_export_rows())
         except Exception as e:
             raise StorageError(f"Failed to export to CSV: {str(e)}")
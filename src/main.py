@@ -1,18 +1,17 @@
+from decimal import Decimal
 from typing import Dict
-from src.expense_manager import ExpenseManager
-from src.storage_handler import StorageHandler
 from src.cli_parser import create_parser
 from src.exceptions import ValidationError, BudgetError, StorageError
 
 
-def parse_category_limits(limits_str: str) -> Dict[str, float]:
+def parse_category_limits(limits_str: str) -> Dict[str, Decimal]:
     if not limits_str:
         return {}
     try:
         return {
-            category: float(amount)
-            for category, amount in
-            (pair.split(':') for pair in limits_str.split(','))
+            category: Decimal(amount)
+            for pair in limits_str.split(',')
+            for category, _, amount in [pair.partition(':')]
         }
     except Exception:
         raise ValidationError("Invalid category limits format. "
@@ -24,6 +23,10 @@ def main():
     args = parser.parse_args()
 
     try:
+        # Deferred so that --help and argument errors skip loading storage
+        from src.expense_manager import ExpenseManager
+        from src.storage_handler import StorageHandler
+
         storage = StorageHandler()
         manager = ExpenseManager(storage)
 
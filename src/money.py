@@ -0,0 +1,6 @@
+from decimal import Context, Decimal
+
+CENT = Decimal('0.01')
+
+# Wide enough to hold any finite float amount exactly at cent precision
+MONEY_CONTEXT = Context(prec=400)
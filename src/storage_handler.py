@@ -1,59 +1,262 @@
 import json
+import os
+import sys
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterator, Optional, Tuple, Union
 from decimal import Decimal
 from datetime import datetime
 from .expense import Expense
 from .budget import Budget
 from .exceptions import StorageError
+from .money import MONEY_CONTEXT
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+_Cents = Union[int, Decimal]
+
+
+def _to_cents(amount: Decimal) -> _Cents:
+    cents = amount.scaleb(2, context=MONEY_CONTEXT)
+    # Older records may hold sub-cent amounts; keep those as an exact
+    # Decimal number of cents instead of rounding them into the totals
+    if amount.as_tuple().exponent < -2:
+        return cents
+    return int(cents)
+
+
+def _from_cents(cents: _Cents) -> Decimal:
+    return Decimal(cents).scaleb(-2, context=MONEY_CONTEXT)
+
+
+def _loads(raw: bytes):
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data, default=str)
+    return json.dumps(data, separators=(',', ':'), default=str).encode()
+
+
+def _write_atomic(path: Path, payload: bytes) -> None:
+    tmp_path = path.with_name(path.name + '.tmp')
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            # Data must be on disk before the rename, or a power loss can
+            # leave an empty file behind the new name
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def _read_json(path: Path):
+    return _loads(path.read_bytes())
+
+
+def _write_json(path: Path, data) -> None:
+    _write_atomic(path, _dumps(data))
+
+
+def _parse_jsonl(raw: bytes) -> Tuple[List[Dict], bool]:
+    # Also reports whether a torn final line (an append cut short before
+    # its newline) was dropped
+    lines = raw.splitlines()
+    records = []
+    for i, line in enumerate(lines):
+        if not line.strip():
+            continue
+        try:
+            records.append(_loads(line))
+        except ValueError:
+            if i == len(lines) - 1 and not raw.endswith(b'\n'):
+                return records, True
+            raise
+    return records, False
+
+
+def _write_jsonl(path: Path, records: List[Dict]) -> None:
+    _write_atomic(path, b''.join(_dumps(r) + b'\n' for r in records))
+
+
+def _append_jsonl(path: Path, record: Dict) -> None:
+    with open(path, 'a+b') as f:
+        prefix = b''
+        # Never glue a record onto a last line that lacks its newline
+        if f.seek(0, os.SEEK_END) > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                prefix = b'\n'
+        f.write(prefix + _dumps(record) + b'\n')
+        f.flush()
+        os.fsync(f.fileno())
 
 
 class StorageHandler:
     def __init__(self,
-                 storage_path: str = 'data/expenses.json',
+                 storage_path: str = 'data/expenses.jsonl',
                  budget_path: str = 'data/budgets.json'):
         self.storage_path = Path(storage_path)
         self.budget_path = Path(budget_path)
+        self._expenses_cache: Optional[List[Dict]] = None
+        self._budgets_cache: Optional[Dict[Tuple[int, int], Budget]] = None
+        # Running totals are kept in cents, as ints unless a record has
+        # sub-cent precision
+        self._monthly_totals: Dict[Tuple[int, int], _Cents] = {}
+        self._cat_totals: Dict[Tuple[int, int, str], _Cents] = {}
+        self._cat_year_totals: Dict[Tuple[int, str], _Cents] = {}
+        self._cat_month_totals: Dict[Tuple[int, str], _Cents] = {}
+        self._cat_totals_all: Dict[str, _Cents] = {}
         self._init_storage()
+        expenses = self._load_expenses()
+        try:
+            for exp in expenses:
+                self._update_totals(exp)
+            self._next_id = max((exp['id'] for exp in expenses),
+                                default=0) + 1
+        except Exception as e:
+            raise StorageError(f"Failed to load expenses: {str(e)}")
+        self._load_budgets()
 
     def _init_storage(self):
         try:
             self.storage_path.parent.mkdir(parents=True, exist_ok=True)
+            legacy_path = self.storage_path.with_suffix('.json')
             if not self.storage_path.exists():
-                self._save_expenses([])
+                if legacy_path != self.storage_path and legacy_path.exists():
+                    # Pick up an older expenses.json store; _load_expenses
+                    # converts the copied array to JSON Lines
+                    _write_atomic(self.storage_path, legacy_path.read_bytes())
+                else:
+                    self._save_expenses([])
             if not self.budget_path.exists():
-                self._save_budgets([])
+                self._save_budgets({})
         except Exception as e:
             raise StorageError(f"Failed to initalize storage: {str(e)}")
 
     def _load_expenses(self) -> List[Dict]:
+        if self._expenses_cache is not None:
+            return self._expenses_cache
         try:
-            with open(self.storage_path, 'r') as f:
-                return json.load(f)
+            raw = self.storage_path.read_bytes()
+            if raw.lstrip().startswith(b'['):
+                # Legacy single-array file, upgrade it to JSON Lines
+                self._expenses_cache = _loads(raw)
+                _write_jsonl(self.storage_path, self._expenses_cache)
+            else:
+                self._expenses_cache, torn = _parse_jsonl(raw)
+                if torn:
+                    # Drop the partial record so later appends stay valid
+                    _write_jsonl(self.storage_path, self._expenses_cache)
+            # Few distinct categories, share one str object per category
+            for exp in self._expenses_cache:
+                exp['category'] = sys.intern(exp['category'])
         except Exception as e:
             raise StorageError(f"Failed to load expenses: {str(e)}")
+        return self._expenses_cache
 
     def _save_expenses(self, expenses: List[Dict]) -> None:
         try:
-            with open(self.storage_path, 'w') as f:
-                json.dump(expenses, f, indent=2, default=str)
+            _write_jsonl(self.storage_path, expenses)
+        except Exception as e:
+            raise StorageError(f"Failed to save expenses: {str(e)}")
+
+    def _append_expense(self, expense_dict: Dict) -> None:
+        try:
+            _append_jsonl(self.storage_path, expense_dict)
         except Exception as e:
             raise StorageError(f"Failed to save expenses: {str(e)}")
 
-    def _load_budgets(self) -> List[Dict]:
+    def _load_budgets(self) -> Dict[Tuple[int, int], Budget]:
+        if self._budgets_cache is not None:
+            return self._budgets_cache
         try:
-            with open(self.budget_path, 'r') as f:
-                return json.load(f)
+            data = _read_json(self.budget_path)
+            # Older files store budgets as a plain list
+            records = data.values() if isinstance(data, dict) else data
+            self._budgets_cache = {
+                (b['month'], b['year']): self._budget_from_dict(b)
+                for b in records
+            }
         except Exception as e:
             raise StorageError(f"Failed to load budgets: {str(e)}")
+        return self._budgets_cache
 
-    def _save_budgets(self, budgets: List[Dict]) -> None:
+    def _save_budgets(self, budgets: Dict[Tuple[int, int], Budget]) -> None:
         try:
-            with open(self.budget_path, 'w') as f:
-                json.dump(budgets, f, indent=2, default=str)
+            _write_json(self.budget_path, {
+                f"{month}-{year}": self._budget_to_dict(budget)
+                for (month, year), budget in budgets.items()
+            })
         except Exception as e:
             raise StorageError(f"Failed to save budgets: {str(e)}")
 
+    @staticmethod
+    def _budget_to_dict(budget: Budget) -> Dict:
+        return {
+            'month': budget.month,
+            'year': budget.year,
+            'amount': str(budget.amount),
+            'category_limits': {
+                k: str(v) for k, v in (budget.category_limits or {}).items()
+            }
+        }
+
+    @staticmethod
+    def _budget_from_dict(budget_dict: Dict) -> Budget:
+        return Budget(
+            month=budget_dict['month'],
+            year=budget_dict['year'],
+            amount=Decimal(budget_dict['amount']),
+            category_limits={
+                k: Decimal(v) for k, v in
+                budget_dict['category_limits'].items()
+                }
+            if budget_dict.get('category_limits') else None
+        )
+
+    def _update_totals(self, expense_dict: Dict, sign: int = 1) -> None:
+        date = datetime.fromisoformat(expense_dict['date'])
+        category = expense_dict['category']
+        cents = _to_cents(Decimal(expense_dict['amount'])) * sign
+        for totals, key in (
+                (self._monthly_totals, (date.year, date.month)),
+                (self._cat_totals, (date.year, date.month, category)),
+                (self._cat_year_totals, (date.year, category)),
+                (self._cat_month_totals, (date.month, category)),
+                (self._cat_totals_all, category)):
+            current = totals.get(key, 0)
+            if isinstance(current, int) and isinstance(cents, int):
+                totals[key] = current + cents
+            else:
+                # Sub-cent buckets add exactly in the wide money context,
+                # not the default 28-digit one
+                totals[key] = MONEY_CONTEXT.add(current, cents)
+
+    def monthly_total(self, month: int, year: int) -> Decimal:
+        return _from_cents(self._monthly_totals.get((year, month), 0))
+
+    def category_total(self, category: str, month: Optional[int] = None,
+                       year: Optional[int] = None) -> Decimal:
+        if month is None and year is None:
+            return _from_cents(self._cat_totals_all.get(category, 0))
+        if month is not None and year is not None:
+            return _from_cents(
+                self._cat_totals.get((year, month, category), 0))
+        if month is None:
+            return _from_cents(
+                self._cat_year_totals.get((year, category), 0))
+        return _from_cents(self._cat_month_totals.get((month, category), 0))
+
     def get_all_expenses(self) -> List[Expense]:
         try:
             expenses_data = self._load_expenses()
@@ -70,62 +273,49 @@ class StorageHandler:
         except Exception as e:
             raise StorageError(f"Failed to retrieve expenses: {str(e)}")
 
+    def iter_export_rows(self) -> Iterator[Tuple]:
+        # Stored dates are ISO strings, so the first 10 chars are YYYY-MM-DD
+        for exp in self._load_expenses():
+            yield (exp['id'], exp['date'][:10], exp['description'],
+                   float(exp['amount']), exp['category'])
+
     def add_expense(self, expense: Expense) -> int:
         expenses = self._load_expenses()
-        new_id = max([exp['id'] for exp in expenses], default=0) + 1
+        new_id = self._next_id
         expense_dict = {
             'id': new_id,
             'date': expense.date.isoformat(),
             'description': expense.description,
             'amount': str(expense.amount),
-            'category': expense.category
+            'category': sys.intern(expense.category)
         }
+        # Persist first so a failed write leaves the cache untouched
+        self._append_expense(expense_dict)
         expenses.append(expense_dict)
-        self._save_expenses(expenses)
+        self._next_id += 1
+        self._update_totals(expense_dict)
         return new_id
 
     def delete_expense(self, expense_id: int) -> bool:
         expenses = self._load_expenses()
-        initial_length = len(expenses)
-        expenses = [exp for exp in expenses if exp['id'] != expense_id]
-        if len(expenses) == initial_length:
+        remaining = [exp for exp in expenses if exp['id'] != expense_id]
+        if len(remaining) == len(expenses):
             return False
-        self._save_expenses(expenses)
+        self._save_expenses(remaining)
+        self._expenses_cache = remaining
+        for exp in expenses:
+            if exp['id'] == expense_id:
+                self._update_totals(exp, sign=-1)
         return True
 
     def set_budget(self, budget: Budget) -> None:
-        budgets = self._load_budgets()
-        budget_dict = {
-            'month': budget.month,
-            'year': budget.year,
-            'amount': str(budget.amount),
-            'category_limits': {
-                k: str(v) for k, v in (budget.category_limits or {}).items()
-            }
-        }
-
-        # Remove existing budget for month/year if exists
-        budgets = [b for b in budgets if not (
-            b['month'] == budget.month and b['year'] == budget.year)]
-        budgets.append(budget_dict)
+        budgets = dict(self._load_budgets())
+        budgets[(budget.month, budget.year)] = budget
         self._save_budgets(budgets)
+        self._budgets_cache = budgets
 
-    def get_budget(self, month: int, year: int) -> Optional[Budget]:
-        budgets = self._load_budgets()
-        budget_dict = next(
-            (b for b in budgets if b['month'] == month and b['year'] == year),
-            None
-        )
+    def has_budgets(self) -> bool:
+        return bool(self._load_budgets())
 
-        if budget_dict:
-            return Budget(
-                month=budget_dict['month'],
-                year=budget_dict['year'],
-                amount=Decimal(budget_dict['amount']),
-                category_limits={
-                    k: Decimal(v) for k, v in
-                    budget_dict['category_limits'].items()
-                    }
-                if budget_dict.get('category_limits') else None
-            )
-        return None
+    def get_budget(self, month: int, year: int) -> Optional[Budget]:
+        return self._load_budgets().get((month, year))
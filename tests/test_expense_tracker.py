@@ -1,49 +1,144 @@
+import dataclasses
+import re
+import sys
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import Mock
 from datetime import datetime
 from decimal import Decimal
-import tempfile
-import os
 import argparse
 
 from src.expense import Expense
 from src.budget import Budget
-from src.storage_handler import StorageHandler
-from src.expense_manager import ExpenseManager
-from src.exceptions import ValidationError, BudgetError
-from src.cli_parser import create_parser
-from src.main import parse_category_limits, main
+from src.exceptions import ValidationError, BudgetError, StorageError
+
+pytestmark = pytest.mark.filterwarnings("error")
+
+NOW = datetime(2024, 1, 15, 12, 0, 0)
+
+DNEG50 = Decimal("-50.00")
+D20 = Decimal("20.00")
+D50 = Decimal("50.00")
+D90 = Decimal("90.00")
+D100 = Decimal("100.00")
+D500 = Decimal("500.00")
+D1000 = Decimal("1000.00")
+D1200 = Decimal("1200.00")
+
+_EMPTY_DESC = re.compile("Description cannot be empty")
+_NEG_AMT = re.compile("Amount must be greater than 0")
+_BAD_MONTH = re.compile("Invalid month")
+_CAT_SUM = re.compile("Sum of category budgets exceeds total budget")
+
+
+def _reopen(storage):
+    """Open a fresh handler on the same files as the given storage."""
+    return type(storage)(
+        storage_path=storage.storage_path,
+        budget_path=storage.budget_path
+    )
 
 
 # Fixtures
+# Storage, manager and CLI modules are imported inside the fixtures that use
+# them, so `-k` runs over the model tests skip loading them at collection.
+@pytest.fixture(scope="session")
+def _storage_root(tmp_path_factory):
+    """Fixture providing one temporary directory for all storage files."""
+    return tmp_path_factory.mktemp("storage")
+
+
 @pytest.fixture
-def temp_storage():
+def temp_storage(_storage_root, request):
     """Fixture providing temporary storage paths for testing."""
-    temp_dir = tempfile.mkdtemp()
-    expenses_path = os.path.join(temp_dir, "expenses.json")
-    budgets_path = os.path.join(temp_dir, "budgets.json")
-    storage = StorageHandler(
+    from src.storage_handler import StorageHandler
+
+    name = request.node.name
+    expenses_path = _storage_root / f"{name}-expenses.jsonl"
+    budgets_path = _storage_root / f"{name}-budgets.json"
+    # Pre-write empty stores so the handler skips its initialization writes
+    expenses_path.write_text("")
+    budgets_path.write_text("{}")
+    return StorageHandler(
         storage_path=expenses_path,
         budget_path=budgets_path
     )
-    yield storage
 
-    # Cleanup
-    for file in [expenses_path, budgets_path]:
-        if os.path.exists(file):
-            os.remove(file)
-    os.rmdir(temp_dir)
+
+@pytest.fixture(scope="session")
+def parser():
+    """Fixture providing the CLI argument parser."""
+    from src.cli_parser import create_parser
+
+    return create_parser()
+
+
+@pytest.fixture
+def run_main(monkeypatch, capsys):
+    """Fixture running main() with the given argv and returning stdout."""
+    from src.main import main
+
+    def _run(argv):
+        monkeypatch.setattr(sys, "argv", argv)
+        main()
+        return capsys.readouterr().out
+    return _run
+
+
+@pytest.fixture
+def main_mocks(monkeypatch):
+    """Fixture replacing the storage and manager built by main()."""
+    mock_storage = Mock()
+    mock_manager = Mock()
+    monkeypatch.setattr("src.storage_handler.StorageHandler",
+                        lambda *args, **kwargs: mock_storage)
+    monkeypatch.setattr("src.expense_manager.ExpenseManager",
+                        lambda *args, **kwargs: mock_manager)
+    return mock_manager, mock_storage
+
+
+@pytest.fixture(scope="class")
+def sample_expense():
+    """Fixture providing a valid expense for read-only tests."""
+    return Expense(
+        description="Test expense",
+        amount=D50,
+        date=NOW,
+        category="groceries"
+    )
+
+
+@pytest.fixture
+def sample_budget():
+    """Fixture providing a January 2024 budget with a groceries limit."""
+    return Budget(
+        month=1,
+        year=2024,
+        amount=D1000,
+        category_limits={"groceries": D500}
+    )
+
+
+@pytest.fixture
+def parse_category_limits():
+    """Fixture providing the CLI category limits parser."""
+    from src.main import parse_category_limits
+
+    return parse_category_limits
 
 
 @pytest.fixture
 def mock_storage():
     """Fixture providing a mocked storage handler."""
-    return Mock()
+    from src.storage_handler import StorageHandler
+
+    return Mock(spec_set=StorageHandler)
 
 
 @pytest.fixture
 def expense_manager(mock_storage):
     """Fixture providing an ExpenseManager with mocked storage."""
+    from src.expense_manager import ExpenseManager
+
     return ExpenseManager(mock_storage)
 
 
@@ -51,75 +146,53 @@ def expense_manager(mock_storage):
 class TestExpense:
     """Tests for the Expense class."""
 
-    def test_valid_expense_creation(self):
+    def test_valid_expense_creation(self, sample_expense):
         """✓ Should create a valid expense with correct attributes."""
-        expense = Expense(
-            description="Test expense",
-            amount=Decimal("50.00"),
-            date=datetime.now(),
-            category="groceries"
-        )
-        assert expense.description == "Test expense"
-        assert expense.amount == Decimal("50.00")
-        assert expense.category == "groceries"
-
-    def test_invalid_expense_empty_description(self):
-        """✗ Should raise ValidationError for empty description."""
-        with pytest.raises(ValidationError,
-                           match="Description cannot be empty"):
-            Expense(
-                description="",
-                amount=Decimal("50.00"),
-                date=datetime.now(),
-                category="groceries"
-            )
-
-    def test_invalid_expense_negative_amount(self):
-        """✗ Should raise ValidationError for negative amount."""
-        with pytest.raises(ValidationError,
-                           match="Amount must be greater than 0"):
-            Expense(
-                description="Test expense",
-                amount=Decimal("-50.00"),
-                date=datetime.now(),
-                category="groceries"
-            )
+        assert sample_expense.description == "Test expense"
+        assert sample_expense.amount == D50
+        assert sample_expense.category == "groceries"
+
+    @pytest.mark.parametrize("kwargs,msg", [
+        ({"description": ""}, _EMPTY_DESC),
+        ({"amount": DNEG50}, _NEG_AMT),
+    ], ids=["empty-description", "negative-amount"])
+    def test_invalid_expense(self, kwargs, msg):
+        """✗ Should raise ValidationError for each invalid field."""
+        fields = dict(description="Test expense", amount=D50, date=NOW,
+                      category="groceries")
+        fields.update(kwargs)
+        with pytest.raises(ValidationError, match=msg):
+            Expense(**fields)
 
 
 class TestBudget:
     """Tests for the Budget class."""
 
-    def test_valid_budget_creation(self):
+    def test_valid_budget_creation(self, sample_budget):
         """✓ Should create a valid budget with category limits."""
-        budget = Budget(
-            month=1,
-            year=2024,
-            amount=Decimal("1000.00"),
-            category_limits={"groceries": Decimal("500.00")}
-        )
-        budget.validate()
-        assert budget.month == 1
-        assert budget.amount == Decimal("1000.00")
+        sample_budget.validate()
+        assert sample_budget.month == 1
+        assert sample_budget.amount == D1000
 
     def test_invalid_budget_month(self):
         """✗ Should raise BudgetError for invalid month."""
-        with pytest.raises(BudgetError, match="Invalid month"):
-            budget = Budget(month=13, year=2024, amount=Decimal("1000.00"))
+        with pytest.raises(BudgetError, match=_BAD_MONTH):
+            budget = Budget(month=13, year=2024, amount=D1000)
             budget.validate()
 
     def test_invalid_category_limits(self):
         """✗ Should raise BudgetError when category limits exceed total budget."""
-        with pytest.raises(BudgetError,
-                           match="Sum of category budgets exceeds total budget"):
+        with pytest.raises(BudgetError, match=_CAT_SUM):
             budget = Budget(
                 month=1,
                 year=2024,
-                amount=Decimal("1000.00"),
-                category_limits={"groceries": Decimal("1200.00")}
+                amount=D1000,
+                category_limits={"groceries": D1200}
             )
             budget.validate()
 
 
+@pytest.mark.io
 class TestStorageHandler:
     """Tests for the StorageHandler class."""
 
@@ -127,8 +200,8 @@ class TestStorageHandler:
         """✓ Should correctly add and retrieve an expense."""
         expense = Expense(
             description="Test expense",
-            amount=Decimal("50.00"),
-            date=datetime.now(),
+            amount=D50,
+            date=NOW,
             category="groceries"
         )
         expense_id = temp_storage.add_expense(expense)
@@ -138,20 +211,311 @@ class TestStorageHandler:
         assert expenses[0].description == "Test expense"
         assert expenses[0].id == expense_id
 
-    def test_set_and_get_budget(self, temp_storage):
-        """✓ Should correctly set and retrieve a budget."""
-        budget = Budget(
-            month=1,
-            year=2024,
-            amount=Decimal("1000.00"),
-            category_limits={"groceries": Decimal("500.00")}
+    def test_expenses_persist_across_handlers(self, temp_storage):
+        """✓ Should write cached expenses through to disk."""
+        expense = Expense(
+            description="Test expense",
+            amount=D50,
+            date=NOW,
+            category="groceries"
+        )
+        expense_id = temp_storage.add_expense(expense)
+        reloaded = _reopen(temp_storage)
+        expenses = reloaded.get_all_expenses()
+
+        assert len(expenses) == 1
+        assert expenses[0].id == expense_id
+
+    def test_failed_write_leaves_cache_unchanged(self, temp_storage,
+                                                 monkeypatch):
+        """✗ Should not record an expense in memory if saving it fails."""
+        def fail(*args, **kwargs):
+            raise OSError("disk full")
+
+        monkeypatch.setattr('src.storage_handler._append_jsonl', fail)
+        with pytest.raises(StorageError):
+            temp_storage.add_expense(Expense(
+                description="Test expense",
+                amount=D50,
+                date=NOW,
+                category="groceries"
+            ))
+        monkeypatch.undo()
+
+        assert temp_storage.get_all_expenses() == []
+        assert temp_storage.monthly_total(NOW.month, NOW.year) == 0
+        assert temp_storage.add_expense(Expense(
+            description="Test expense",
+            amount=D50,
+            date=NOW,
+            category="groceries"
+        )) == 1
+
+    def test_failed_rewrite_keeps_store(self, temp_storage, sample_budget,
+                                        monkeypatch):
+        """✗ Should keep the old file and remove the temp file on failure."""
+        temp_storage.set_budget(sample_budget)
+        before = temp_storage.budget_path.read_bytes()
+
+        def fail(*args, **kwargs):
+            raise OSError("fsync failed")
+
+        monkeypatch.setattr('src.storage_handler.os.fsync', fail)
+        with pytest.raises(StorageError):
+            temp_storage.set_budget(
+                dataclasses.replace(sample_budget, month=2))
+
+        assert temp_storage.budget_path.read_bytes() == before
+        assert not temp_storage.budget_path.with_name(
+            temp_storage.budget_path.name + '.tmp').exists()
+        assert temp_storage.get_budget(2, 2024) is None
+
+    def test_append_after_missing_trailing_newline(self, temp_storage):
+        """✓ Should start a new line when the store lacks a final newline."""
+        temp_storage.storage_path.write_text(
+            '{"id": 1, "date": "2024-01-15T12:00:00", '
+            '"description": "Test expense", "amount": "50.00", '
+            '"category": "groceries"}'
         )
-        temp_storage.set_budget(budget)
+        storage = _reopen(temp_storage)
+        storage.add_expense(Expense(
+            description="Second expense",
+            amount=D20,
+            date=NOW,
+            category="groceries"
+        ))
+
+        assert [e.id for e in _reopen(storage).get_all_expenses()] == [1, 2]
+
+    def test_torn_final_line_is_dropped(self, temp_storage):
+        """✓ Should drop a partially written last record on load."""
+        temp_storage.storage_path.write_text(
+            '{"id": 1, "date": "2024-01-15T12:00:00", '
+            '"description": "Test expense", "amount": "50.00", '
+            '"category": "groceries"}\n'
+            '{"id": 2, "date": "2024-01-'
+        )
+        storage = _reopen(temp_storage)
+        assert [e.id for e in storage.get_all_expenses()] == [1]
+
+        storage.add_expense(Expense(
+            description="Second expense",
+            amount=D20,
+            date=NOW,
+            category="groceries"
+        ))
+
+        assert [e.id for e in _reopen(storage).get_all_expenses()] == [1, 2]
+
+    def test_corrupt_middle_line_raises(self, temp_storage):
+        """✗ Should raise StorageError for a bad record before the last."""
+        temp_storage.storage_path.write_text(
+            'not json\n'
+            '{"id": 1, "date": "2024-01-15T12:00:00", '
+            '"description": "Test expense", "amount": "50.00", '
+            '"category": "groceries"}\n'
+        )
+
+        with pytest.raises(StorageError, match="Failed to load expenses"):
+            _reopen(temp_storage)
+
+    @pytest.mark.parametrize("record", [
+        '{"id": 1, "date": "bad", "description": "Test expense", '
+        '"amount": "50.00", "category": "groceries"}',
+        '{"id": 1, "date": "2024-01-15T12:00:00", '
+        '"description": "Test expense", "category": "groceries"}',
+    ], ids=["bad-date", "missing-amount"])
+    def test_malformed_record_raises(self, temp_storage, record):
+        """✗ Should raise StorageError for a malformed stored expense."""
+        temp_storage.storage_path.write_text(record + "\n")
+
+        with pytest.raises(StorageError, match="Failed to load expenses"):
+            _reopen(temp_storage)
+
+    def test_legacy_json_array_is_upgraded(self, temp_storage):
+        """✓ Should load and convert a legacy single-array expenses file."""
+        temp_storage.storage_path.write_text(
+            '[{"id": 1, "date": "2024-01-15T12:00:00", '
+            '"description": "Test expense", "amount": "50.00", '
+            '"category": "groceries"}]'
+        )
+        reloaded = _reopen(temp_storage)
+        reloaded.add_expense(Expense(
+            description="Second expense",
+            amount=D20,
+            date=datetime(2024, 1, 16),
+            category="groceries"
+        ))
+
+        lines = temp_storage.storage_path.read_text().splitlines()
+        assert len(lines) == 2
+        assert reloaded.category_total("groceries", 1, 2024) == \
+            Decimal("70.00")
+
+    def test_legacy_json_store_is_migrated(self, tmp_path):
+        """✓ Should pick up expenses.json when expenses.jsonl is missing."""
+        from src.storage_handler import StorageHandler
+
+        (tmp_path / "expenses.json").write_text(
+            '[{"id": 1, "date": "2024-01-15T12:00:00", '
+            '"description": "Test expense", "amount": "200.0", '
+            '"category": "Food"}]'
+        )
+        storage = StorageHandler(
+            storage_path=tmp_path / "expenses.jsonl",
+            budget_path=tmp_path / "budgets.json"
+        )
+
+        assert storage.category_total("Food") == Decimal("200.0")
+        assert storage.add_expense(Expense(
+            description="Second expense",
+            amount=D20,
+            date=NOW,
+            category="Food"
+        )) == 2
+        assert len(_reopen(storage).get_all_expenses()) == 2
+
+    def test_stdlib_json_fallback(self, temp_storage, monkeypatch):
+        """✓ Should round-trip expenses without orjson installed."""
+        monkeypatch.setattr('src.storage_handler.orjson', None)
+        expense = Expense(
+            description="Test expense",
+            amount=D50,
+            date=NOW,
+            category="groceries"
+        )
+        temp_storage.add_expense(expense)
+        reloaded = _reopen(temp_storage)
+
+        assert reloaded.get_all_expenses()[0].amount == D50
+
+    def test_running_totals(self, temp_storage):
+        """✓ Should keep monthly and category totals in sync with adds."""
+        date = datetime(2024, 1, 15)
+        for amount, category in [("50.00", "groceries"),
+                                 ("20.00", "utilities")]:
+            temp_storage.add_expense(Expense(
+                description="Test expense",
+                amount=Decimal(amount),
+                date=date,
+                category=category
+            ))
+
+        assert temp_storage.monthly_total(1, 2024) == Decimal("70.00")
+        assert temp_storage.monthly_total(2, 2024) == Decimal("0")
+        assert temp_storage.category_total("groceries", 1, 2024) == D50
+        assert temp_storage.category_total("groceries") == D50
+        assert temp_storage.category_total("utilities", year=2024) == D20
+        assert temp_storage.category_total("utilities", month=1) == D20
+
+    def test_month_total_across_years(self, temp_storage):
+        """✓ Should sum a month-only category query over every year."""
+        for amount, date in [("50.00", datetime(2023, 1, 10)),
+                             ("20.00", datetime(2024, 1, 15)),
+                             ("90.00", datetime(2024, 2, 1))]:
+            temp_storage.add_expense(Expense(
+                description="Test expense",
+                amount=Decimal(amount),
+                date=date,
+                category="utilities"
+            ))
+
+        assert temp_storage.category_total("utilities", month=1) == \
+            Decimal("70.00")
+        assert temp_storage.category_total("utilities", 1, 2024) == D20
+        assert temp_storage.category_total("utilities") == Decimal("160.00")
+
+    def test_totals_exact_for_sub_cent_amounts(self, temp_storage):
+        """✓ Should not round legacy sub-cent amounts in the totals."""
+        for amount in ("0.333", "0.333", "0.335"):
+            temp_storage.add_expense(Expense(
+                description="Test expense",
+                amount=Decimal(amount),
+                date=NOW,
+                category="groceries"
+            ))
+
+        expected = sum(e.amount for e in temp_storage.get_all_expenses())
+        assert expected == Decimal("1.001")
+        assert temp_storage.monthly_total(NOW.month, NOW.year) == expected
+        assert temp_storage.category_total("groceries") == expected
+
+    def test_delete_expense(self, temp_storage):
+        """✓ Should remove the expense from the file and every total."""
+        ids = [
+            temp_storage.add_expense(Expense(
+                description="Test expense",
+                amount=Decimal(amount),
+                date=date,
+                category=category
+            ))
+            for amount, date, category in [
+                ("50.00", datetime(2024, 1, 15), "groceries"),
+                ("20.00", datetime(2024, 1, 16), "groceries"),
+                ("90.00", datetime(2023, 1, 10), "groceries"),
+                ("100.00", datetime(2024, 1, 20), "utilities"),
+            ]
+        ]
+
+        assert temp_storage.delete_expense(ids[0]) is True
+        assert temp_storage.delete_expense(999) is False
+
+        for storage in (temp_storage, _reopen(temp_storage)):
+            assert [e.id for e in storage.get_all_expenses()] == ids[1:]
+            assert storage.monthly_total(1, 2024) == Decimal("120.00")
+            assert storage.category_total("groceries", 1, 2024) == D20
+            assert storage.category_total("groceries", year=2024) == D20
+            assert storage.category_total("groceries", month=1) == \
+                Decimal("110.00")
+            assert storage.category_total("groceries") == Decimal("110.00")
+
+    def test_totals_exact_for_large_sub_cent_mix(self, temp_storage):
+        """✓ Should not round a large total that mixes in sub-cents."""
+        for amount in ("1000000000000000019884624838656.00", "0.001"):
+            temp_storage.add_expense(Expense(
+                description="Test expense",
+                amount=Decimal(amount),
+                date=NOW,
+                category="groceries"
+            ))
+
+        expected = Decimal("1000000000000000019884624838656.001")
+        assert temp_storage.monthly_total(NOW.month, NOW.year) == expected
+        assert temp_storage.category_total("groceries") == expected
+
+    def test_iter_export_rows(self, temp_storage):
+        """✓ Should yield CSV-ready rows with the date as YYYY-MM-DD."""
+        expense_id = temp_storage.add_expense(Expense(
+            description="Test expense",
+            amount=D50,
+            date=datetime(2024, 1, 15, 12, 30),
+            category="groceries"
+        ))
+
+        assert list(temp_storage.iter_export_rows()) == [
+            (expense_id, "2024-01-15", "Test expense", 50.0, "groceries")
+        ]
+
+    def test_set_and_get_budget(self, temp_storage, sample_budget):
+        """✓ Should correctly set and retrieve a budget."""
+        assert not temp_storage.has_budgets()
+        temp_storage.set_budget(sample_budget)
+        assert temp_storage.has_budgets()
 
         retrieved_budget = temp_storage.get_budget(1, 2024)
-        assert retrieved_budget.amount == Decimal("1000.00")
-        assert retrieved_budget.category_limits["groceries"] == \
-            Decimal("500.00")
+        assert retrieved_budget.amount == D1000
+        assert retrieved_budget.category_limits["groceries"] == D500
+
+    def test_set_budget_replaces_existing(self, temp_storage):
+        """✓ Should keep one budget per month and persist the latest."""
+        temp_storage.set_budget(
+            Budget(month=1, year=2024, amount=D1000))
+        temp_storage.set_budget(
+            Budget(month=1, year=2024, amount=Decimal("800.00")))
+        reloaded = _reopen(temp_storage)
+
+        assert len(reloaded._load_budgets()) == 1
+        assert reloaded.get_budget(1, 2024).amount == Decimal("800.00")
 
 
 class TestExpenseManager:
@@ -164,7 +528,7 @@ class TestExpenseManager:
 
         expense_id, warning = expense_manager.add_expense(
             description="Test expense",
-            amount=50.00,
+            amount=D50,
             category="groceries"
         )
 
@@ -172,62 +536,147 @@ class TestExpenseManager:
         assert warning is None
         mock_storage.add_expense.assert_called_once()
 
-    def test_budget_warning(self, expense_manager, mock_storage):
-        """✓ Should generate warning when expense exceeds budget."""
+    def test_add_expense_without_any_budget(self, expense_manager,
+                                            mock_storage):
+        """✓ Should skip the budget lookup when no budgets are set."""
         mock_storage.add_expense.return_value = 1
-        mock_storage.get_budget.return_value = Budget(
-            month=datetime.now().month,
-            year=datetime.now().year,
-            amount=Decimal("100.00"),
-            category_limits={"groceries": Decimal("50.00")}
+        mock_storage.has_budgets.return_value = False
+
+        _, warning = expense_manager.add_expense(
+            description="Test expense",
+            amount=D50,
+            category="groceries"
+        )
+
+        assert warning is None
+        mock_storage.get_budget.assert_not_called()
+
+    @pytest.mark.parametrize("amount,expected", [
+        (Decimal("19.999"), "20.00"),
+        (Decimal("1.015"), "1.02"),
+        (Decimal("10.995"), "11.00"),
+        (Decimal("2.675"), "2.68"),
+        (Decimal("2.665"), "2.66"),
+    ])
+    def test_add_expense_rounds_to_cents(self, expense_manager,
+                                         mock_storage, amount, expected):
+        """✓ Should store typed amounts rounded half-even to whole cents."""
+        mock_storage.add_expense.return_value = 1
+        mock_storage.get_budget.return_value = None
+
+        expense_manager.add_expense(
+            description="Test expense",
+            amount=amount,
+            category="groceries"
         )
-        mock_storage.get_all_expenses.return_value = [
-            Expense(
-                description="Previous expense",
-                amount=Decimal("90.00"),
-                date=datetime.now(),
-                category="groceries",
-                id=1
+
+        expense = mock_storage.add_expense.call_args[0][0]
+        assert str(expense.amount) == expected
+
+    def test_add_expense_large_amount(self, expense_manager, mock_storage):
+        """✓ Should accept amounts beyond the default decimal precision."""
+        mock_storage.add_expense.return_value = 1
+        mock_storage.get_budget.return_value = None
+
+        expense_manager.add_expense(
+            description="Test expense",
+            amount=Decimal("1e30"),
+            category="groceries"
+        )
+
+        expense = mock_storage.add_expense.call_args[0][0]
+        assert expense.amount == Decimal("1e30")
+
+    @pytest.mark.parametrize("amount,msg", [
+        (Decimal("0.004"), "rounded to whole cents"),
+        (Decimal("NaN"), "finite number"),
+        (Decimal("Infinity"), "finite number"),
+    ], ids=["sub-cent", "nan", "inf"])
+    def test_add_expense_invalid_amount(self, expense_manager, amount, msg):
+        """✗ Should reject amounts that cannot be stored."""
+        with pytest.raises(ValidationError, match=msg):
+            expense_manager.add_expense(
+                description="Test expense",
+                amount=amount,
+                category="groceries"
             )
-        ]
+
+    def test_add_expense_with_timestamp(self, expense_manager, mock_storage):
+        """✓ Should date the expense with the supplied timestamp."""
+        mock_storage.add_expense.return_value = 1
+        mock_storage.get_budget.return_value = None
+
+        expense_manager.add_expense(
+            description="Test expense",
+            amount=D50,
+            category="groceries",
+            when=NOW
+        )
+
+        assert mock_storage.add_expense.call_args[0][0].date == NOW
+
+    def test_budget_warning(self, expense_manager, mock_storage,
+                            sample_budget):
+        """✓ Should generate warning when expense exceeds budget."""
+        mock_storage.add_expense.return_value = 1
+        mock_storage.get_budget.return_value = dataclasses.replace(
+            sample_budget,
+            amount=D100,
+            category_limits={"groceries": D50}
+        )
+        mock_storage.monthly_total.return_value = D90
+        mock_storage.category_total.return_value = D90
 
         expense_id, warning = expense_manager.add_expense(
             description="Test expense",
-            amount=20.00,
-            category="groceries"
+            amount=D20,
+            category="groceries",
+            when=NOW
         )
 
         assert warning is not None
         assert "budget" in warning.lower()
 
+    @pytest.mark.io
+    def test_export_to_csv(self, expense_manager, mock_storage, tmp_path):
+        """✓ Should write a header and one row per expense."""
+        mock_storage.iter_export_rows.return_value = iter([
+            (1, "2024-01-15", "Test expense", 50.0, "groceries")
+        ])
+        output = tmp_path / "expenses.csv"
+
+        expense_manager.export_to_csv(str(output))
 
-class TestCategoryLimitsParser:
-    """Tests for the category limits parser."""
+        assert output.read_text().splitlines() == [
+            "ID,Date,Description,Amount,Category",
+            "1,2024-01-15,Test expense,50.0,groceries"
+        ]
 
-    def test_valid_category_limits(self):
-        """✓ Should correctly parse valid category limits string."""
-        limits = parse_category_limits("groceries:500.00,utilities:200.00")
-        assert limits["groceries"] == 500.00
-        assert limits["utilities"] == 200.00
 
-    def test_invalid_category_limits_format(self):
-        """✗ Should raise ValidationError for invalid format."""
-        with pytest.raises(ValidationError):
-            parse_category_limits("invalid:format:500")
+class TestCategoryLimitsParser:
+    """Tests for the category limits parser."""
 
-    def test_empty_category_limits(self):
-        """✓ Should return empty dict for empty input."""
-        limits = parse_category_limits("")
-        assert limits == {}
+    @pytest.mark.parametrize("limits_str,expected,raises", [
+        ("groceries:500.00,utilities:200.00",
+         {"groceries": D500, "utilities": Decimal("200.00")}, None),
+        ("", {}, None),
+        ("invalid:format:500", None, ValidationError),
+    ], ids=["valid", "empty", "invalid-format"])
+    def test_parse_category_limits(self, parse_category_limits, limits_str,
+                                   expected, raises):
+        """✓ Should parse valid input and reject malformed pairs."""
+        if raises:
+            with pytest.raises(raises):
+                parse_category_limits(limits_str)
+        else:
+            assert parse_category_limits(limits_str) == expected
 
 
 class TestCliParser:
     """Tests for the CLI argument parser."""
 
-    def test_create_parser(self):
+    def test_create_parser(self, parser):
         """✓ Should create parser with all required commands."""
-        parser = create_parser()
-
         # Check if all commands are present
         subparsers_actions = [
             action for action in parser._actions
@@ -240,67 +689,58 @@ class TestCliParser:
         assert 'category-summary' in commands
         assert 'export' in commands
 
-    def test_add_expense_command(self):
-        """✓ Should correctly parse add expense command."""
-        parser = create_parser()
+    @pytest.mark.parametrize("argv,expected", [
+        (['add',
+          '--description', 'Test expense',
+          '--amount', '50.00',
+          '--category', 'groceries'],
+         {'command': 'add', 'description': 'Test expense',
+          'amount': D50, 'category': 'groceries'}),
+        (['set-budget',
+          '--month', '1',
+          '--year', '2024',
+          '--amount', '1000.00',
+          '--category-limits', 'groceries:500.00,utilities:200.00'],
+         {'command': 'set-budget', 'month': 1, 'year': 2024,
+          'amount': D1000,
+          'category_limits': 'groceries:500.00,utilities:200.00'}),
+        (['category-summary',
+          '--category', 'groceries',
+          '--month', '1',
+          '--year', '2024'],
+         {'command': 'category-summary', 'category': 'groceries',
+          'month': 1, 'year': 2024}),
+        (['export',
+          '--output', 'expenses.csv'],
+         {'command': 'export', 'output': 'expenses.csv'}),
+    ], ids=['add', 'set-budget', 'category-summary', 'export'])
+    def test_command_parsing(self, parser, argv, expected):
+        """✓ Should correctly parse each command and its arguments."""
+        args = parser.parse_args(argv)
+
+        assert {attr: getattr(args, attr) for attr in expected} == expected
+
+    def test_amount_parsed_as_decimal(self, parser):
+        """✓ Should parse --amount exactly as typed, without a float."""
         args = parser.parse_args([
-            'add',
-            '--description', 'Test expense',
-            '--amount', '50.00',
+            'add', '--description', 'Test', '--amount', '1.015',
             '--category', 'groceries'
         ])
 
-        assert args.command == 'add'
-        assert args.description == 'Test expense'
-        assert args.amount == 50.00
-        assert args.category == 'groceries'
+        assert isinstance(args.amount, Decimal)
+        assert str(args.amount) == "1.015"
 
-    def test_set_budget_command(self):
-        """✓ Should correctly parse set budget command."""
-        parser = create_parser()
-        args = parser.parse_args([
-            'set-budget',
-            '--month', '1',
-            '--year', '2024',
-            '--amount', '1000.00',
-            '--category-limits', 'groceries:500.00,utilities:200.00'
-        ])
-
-        assert args.command == 'set-budget'
-        assert args.month == 1
-        assert args.year == 2024
-        assert args.amount == 1000.00
-        assert args.category_limits == 'groceries:500.00,utilities:200.00'
-
-    def test_category_summary_command(self):
-        """✓ Should correctly parse category summary command."""
-        parser = create_parser()
-        args = parser.parse_args([
-            'category-summary',
-            '--category', 'groceries',
-            '--month', '1',
-            '--year', '2024'
-        ])
-
-        assert args.command == 'category-summary'
-        assert args.category == 'groceries'
-        assert args.month == 1
-        assert args.year == 2024
-
-    def test_export_command(self):
-        """✓ Should correctly parse export command."""
-        parser = create_parser()
-        args = parser.parse_args([
-            'export',
-            '--output', 'expenses.csv'
-        ])
-
-        assert args.command == 'export'
-        assert args.output == 'expenses.csv'
+    def test_invalid_amount(self, parser, capsys):
+        """✗ Should exit with a usage error for a non-numeric amount."""
+        with pytest.raises(SystemExit):
+            parser.parse_args([
+                'add', '--description', 'Test', '--amount', 'abc',
+                '--category', 'groceries'
+            ])
+        assert "invalid amount: 'abc'" in capsys.readouterr().err
 
-    def test_invalid_command(self):
+    def test_invalid_command(self, parser):
         """✗ Should exit on invalid command."""
-        parser = create_parser()
         with pytest.raises(SystemExit):
             parser.parse_args(['invalid-command'])
 
@@ -308,139 +748,93 @@ class TestCliParser:
 class TestMain:
     """Tests for the main program functionality."""
 
-    @patch('src.main.StorageHandler')
-    @patch('src.main.ExpenseManager')
-    def test_add_expense_success(self, mock_manager_class, mock_storage_class):
+    def test_add_expense_success(self, main_mocks, run_main):
         """✓ Should successfully add expense."""
         # Setup mocks
-        mock_storage = Mock()
-        mock_manager = Mock()
-        mock_storage_class.return_value = mock_storage
-        mock_manager_class.return_value = mock_manager
+        mock_manager, _ = main_mocks
         mock_manager.add_expense.return_value = (1, None)
 
-        # Run with test arguments
-        with patch('sys.argv', [
+        out = run_main([
             'main.py',
             'add',
             '--description', 'Test expense',
             '--amount', '50.00',
             '--category', 'groceries'
-        ]):
-            with patch('builtins.print') as mock_print:
-                main()
+        ])
 
         # Verify
         mock_manager.add_expense.assert_called_once_with(
             description='Test expense',
-            amount=50.00,
+            amount=D50,
             category='groceries'
         )
-        mock_print.assert_called_with("Expense added successfully (ID: 1)")
+        assert out == "Expense added successfully (ID: 1)\n"
 
-    @patch('src.main.StorageHandler')
-    @patch('src.main.ExpenseManager')
-    def test_set_budget_success(self, mock_manager_class, mock_storage_class):
+    def test_set_budget_success(self, main_mocks, run_main):
         """✓ Should successfully set budget."""
         # Setup mocks
-        mock_storage = Mock()
-        mock_manager = Mock()
-        mock_storage_class.return_value = mock_storage
-        mock_manager_class.return_value = mock_manager
+        mock_manager, _ = main_mocks
 
-        # Run with test arguments
-        with patch('sys.argv', [
+        out = run_main([
             'main.py',
             'set-budget',
             '--month', '1',
             '--year', '2024',
             '--amount', '1000.00',
             '--category-limits', 'groceries:500.00'
-        ]):
-            with patch('builtins.print') as mock_print:
-                main()
+        ])
 
         # Verify
         mock_manager.set_budget.assert_called_once()
-        mock_print.assert_called_with("Budget set successfully for 1/2024")
+        assert out == "Budget set successfully for 1/2024\n"
 
-    @patch('src.main.StorageHandler')
-    @patch('src.main.ExpenseManager')
-    def test_category_summary_success(self, mock_manager_class,
-                                      mock_storage_class):
+    def test_category_summary_success(self, main_mocks, run_main):
         """✓ Should successfully show category summary."""
         # Setup mocks
-        mock_storage = Mock()
-        mock_manager = Mock()
-        mock_storage_class.return_value = mock_storage
-        mock_manager_class.return_value = mock_manager
+        mock_manager, _ = main_mocks
         mock_manager.get_category_summary.return_value = Decimal('150.00')
 
-        # Run with test arguments
-        with patch('sys.argv', [
+        out = run_main([
             'main.py',
             'category-summary',
             '--category', 'groceries',
             '--month', '1',
             '--year', '2024'
-        ]):
-            with patch('builtins.print') as mock_print:
-                main()
+        ])
 
         # Verify
         mock_manager.get_category_summary.assert_called_once()
-        mock_print.assert_called_once()
-
-    def test_parse_category_limits_valid(self):
-        """✓ Should correctly parse valid category limits."""
-        result = parse_category_limits("groceries:500.00,utilities:200.00")
-        assert result == {'groceries': 500.00, 'utilities': 200.00}
-
-    def test_parse_category_limits_invalid(self):
-        """✗ Should raise ValidationError for invalid format."""
-        with pytest.raises(ValidationError):
-            parse_category_limits("invalid:format:500")
-
-    @patch('src.main.StorageHandler')
-    @patch('src.main.ExpenseManager')
-    def test_validation_error_handling(self, mock_manager_class,
-                                       mock_storage_class):
+        assert out == ("Total expenses for category 'groceries' "
+                       "for 1/2024: $150.00\n")
+
+    def test_validation_error_handling(self, main_mocks, run_main, capsys):
         """✓ Should handle ValidationError appropriately."""
-        mock_manager = Mock()
-        mock_manager_class.return_value = mock_manager
+        mock_manager, _ = main_mocks
         mock_manager.add_expense.side_effect = ValidationError("Test error")
 
-        with patch('sys.argv', [
-            'main.py',
-            'add',
-            '--description', 'Test',
-            '--amount', '50.00',
-            '--category', 'groceries'
-        ]):
-            with patch('builtins.print') as mock_print:
-                with pytest.raises(SystemExit) as exc_info:
-                    main()
-                assert exc_info.value.code == 1
-            mock_print.assert_called_with("Validation Error: Test error")
-
-    @patch('src.main.StorageHandler')
-    @patch('src.main.ExpenseManager')
-    def test_budget_error_handling(self, mock_manager_class,
-                                   mock_storage_class):
+        with pytest.raises(SystemExit) as exc_info:
+            run_main([
+                'main.py',
+                'add',
+                '--description', 'Test',
+                '--amount', '50.00',
+                '--category', 'groceries'
+            ])
+        assert exc_info.value.code == 1
+        assert capsys.readouterr().out == "Validation Error: Test error\n"
+
+    def test_budget_error_handling(self, main_mocks, run_main, capsys):
         """✓ Should handle BudgetError appropriately."""
-        mock_manager = Mock()
-        mock_manager_class.return_value = mock_manager
+        mock_manager, _ = main_mocks
         mock_manager.set_budget.side_effect = BudgetError("Test error")
 
-        with patch('sys.argv', [
-            'main.py',
-            'set-budget',
-            '--month', '1',
-            '--year', '2024',
-            '--amount', '1000.00'
-        ]):
-            with patch('builtins.print') as mock_print:
-                with pytest.raises(SystemExit) as exc_info:
-                    main()
-                assert exc_info.value.code == 1
-            mock_print.assert_called_with("Budget Error: Test error")
+        with pytest.raises(SystemExit) as exc_info:
+            run_main([
+                'main.py',
+                'set-budget',
+                '--month', '1',
+                '--year', '2024',
+                '--amount', '1000.00'
+            ])
+        assert exc_info.value.code == 1
+        assert capsys.readouterr().out == "Budget Error: Test error\n"